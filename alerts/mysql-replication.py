@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
-from checks import MySQLReplicationCheck
-import sh
+from checks import MySQLReplicationCheck, interface_address, read_hosts
 import re
 
 
@@ -16,19 +15,16 @@ class Check(MySQLReplicationCheck):
         if the current host is currently the master in the replica set. Adjust to taste.
         """
 
-        # get the service net IP from ifconfig
-        (status, stdout, stderr) = self.shell(sh.ifconfig, 'eth2')
-        if status != 0:
-            raise Exception("Could not get network configuration for eth2: %s" % stderr)
-
-        # eg: inet addr:192.168.5.2  Bcast:192.168.5.255  Mask:255.255.255.0
-        ip = stdout.split('\n')[1].split()[1].split(':')[1]
+        # get the service net IP
+        try:
+            ip = interface_address('eth2')
+        except IOError as e:
+            raise Exception("Could not get network configuration for eth2: %s" % e)
 
         # determine if the current host is supposed to be the master, or not.
-        with open('/etc/hosts', 'r') as f:
-            for l in f:
-                if '%s db-master # fabric' % ip in l:
-                    return True
+        for (names, comment) in read_hosts().get(ip, []):
+            if 'db-master' in names and comment == 'fabric':
+                return True
         return False
 
 
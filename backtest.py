@@ -0,0 +1,317 @@
+"""
+Offline evaluation of alarm criteria against recorded metrics.
+
+The criteria generated by the alerts() methods in checks.py are written in the Rackspace alarm
+language. This module compiles the subset of that language used there -- if statements over
+comparisons of metrics, numbers and strings, combined with && and ||, arithmetic, and the
+percentage() function, each returning a new AlarmStatus -- into functions that evaluate an
+alarm over whole numpy arrays of metric history at once.
+
+Example:
+
+    import backtest
+    data = backtest.load_metrics('history.npz')
+    for (alert, result) in backtest.backtest(check, data):
+        print alert.name, result.transitions
+"""
+import operator
+import re
+import numpy
+
+# alarm states, in order of severity
+OK = 0
+WARNING = 1
+CRITICAL = 2
+SEVERITIES = {'OK': OK, 'WARNING': WARNING, 'CRITICAL': CRITICAL}
+SEVERITY_NAMES = dict([(v, k) for (k, v) in SEVERITIES.items()])
+
+
+class CriteriaError(Exception):
+    """
+    Raised when alarm criteria use a part of the alarm language this module does not support,
+    or cannot be evaluated against the recorded metrics.
+    """
+    pass
+
+
+TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>&&|\|\||==|!=|>=|<=|[-+*/<>!(){}\[\],;])
+    )""", re.VERBOSE)
+
+
+def tokenize(source):
+    """
+    Split alarm criteria into a list of (kind, value) tokens.
+    """
+    tokens = []
+    pos = 0
+    source = source.rstrip()
+    while pos < len(source):
+        m = TOKEN.match(source, pos)
+        if not m:
+            raise CriteriaError('Unexpected input at %r' % source[pos:pos + 20])
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'number':
+            value = float(value)
+        elif kind == 'string':
+            value = re.sub(r'\\(.)', r'\1', value[1:-1])
+        tokens.append((kind, value))
+        pos = m.end()
+    return tokens
+
+
+# binary operators, by precedence level (lowest first), and their vectorized implementations
+BINARY = [
+    {'||': numpy.logical_or},
+    {'&&': numpy.logical_and},
+    {'==': operator.eq, '!=': operator.ne},
+    {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge},
+    {'+': operator.add, '-': operator.sub},
+    {'*': operator.mul, '/': numpy.true_divide},
+]
+
+
+def _percentage(a, b):
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.true_divide(a, b) * 100.0
+
+
+FUNCTIONS = {
+    'percentage': _percentage,
+}
+
+
+class AlarmProgram(object):
+    """
+    Compiled alarm criteria. Calling the program with a dict of metric name -> numpy array
+    returns an array of alarm states (OK, WARNING or CRITICAL), one per sample. As in the
+    alarm language, the first return statement reached decides the state; samples for which
+    no statement returns are OK.
+    """
+
+    def __init__(self, criteria):
+        self.metrics = set()
+        self.tokens = tokenize(criteria)
+        self.pos = 0
+        self.statements = []
+        while self.peek():
+            self.statements.append(self.statement())
+
+    # parser
+
+    def peek(self, value=None):
+        if self.pos >= len(self.tokens):
+            return None
+        token = self.tokens[self.pos]
+        if value is not None and token[1] != value:
+            return None
+        return token
+
+    def take(self, value=None, kind=None):
+        token = self.peek()
+        if token is None or (value is not None and token[1] != value) or \
+                (kind is not None and token[0] != kind):
+            raise CriteriaError('Expected %s, got %r' % (value or kind, token and token[1]))
+        self.pos += 1
+        return token[1]
+
+    def statement(self):
+        """
+        Parse an if statement or a bare return; returns a (condition, severity, metrics) tuple,
+        where condition is None for an unconditional return, and metrics lists the metrics the
+        condition uses.
+        """
+        if self.peek('if'):
+            self.take('if')
+            self.take('(')
+            # collect the condition's metrics on their own, then merge them into the program's
+            seen = self.metrics
+            self.metrics = set()
+            condition = self.expression()
+            used = sorted(self.metrics)
+            self.metrics |= seen
+            self.take(')')
+            self.take('{')
+            severity = self.alarm_status()
+            self.take('}')
+            return (condition, severity, used)
+        return (None, self.alarm_status(), [])
+
+    def alarm_status(self):
+        self.take('return')
+        self.take('new')
+        self.take('AlarmStatus')
+        self.take('(')
+        severity = self.take(kind='name')
+        if severity not in SEVERITIES:
+            raise CriteriaError('Unknown alarm state: %s' % severity)
+        if self.peek(','):
+            self.take(',')
+            self.take(kind='string')
+        self.take(')')
+        if self.peek(';'):
+            self.take(';')
+        return SEVERITIES[severity]
+
+    def expression(self, level=0):
+        if level == len(BINARY):
+            return self.unary()
+        left = self.expression(level + 1)
+        while self.peek() and self.peek()[0] == 'op' and self.peek()[1] in BINARY[level]:
+            func = BINARY[level][self.take()]
+            right = self.expression(level + 1)
+            left = (lambda f, l, r: lambda m: f(l(m), r(m)))(func, left, right)
+        return left
+
+    def unary(self):
+        if self.peek('!'):
+            self.take('!')
+            operand = self.unary()
+            return lambda m: numpy.logical_not(operand(m))
+        if self.peek('-'):
+            self.take('-')
+            operand = self.unary()
+            return lambda m: numpy.negative(operand(m))
+        return self.primary()
+
+    def primary(self):
+        (kind, value) = self.peek() or (None, None)
+        if kind in ('number', 'string'):
+            self.take()
+            return lambda m: value
+        if value == '(':
+            self.take('(')
+            expr = self.expression()
+            self.take(')')
+            return expr
+        if value == 'metric':
+            self.take('metric')
+            self.take('[')
+            name = self.take(kind='string')
+            self.take(']')
+            self.metrics.add(name)
+            return lambda m: m[name]
+        if value in FUNCTIONS:
+            self.take()
+            self.take('(')
+            args = [self.expression()]
+            while self.peek(','):
+                self.take(',')
+                args.append(self.expression())
+            self.take(')')
+            func = FUNCTIONS[value]
+            return lambda m: func(*[a(m) for a in args])
+        raise CriteriaError('Unsupported expression: %r' % value)
+
+    # evaluation
+
+    def __call__(self, data):
+        missing = self.metrics - set(data)
+        if missing:
+            raise CriteriaError('No recorded values for metric(s): %s' %
+                                ', '.join(sorted(missing)))
+
+        if not data:
+            raise CriteriaError('No recorded metrics')
+        sizes = dict([(k, len(v)) for (k, v) in data.items()])
+        if len(set(sizes.values())) > 1:
+            raise CriteriaError('Recorded metrics have different numbers of samples: %s' %
+                                ', '.join(['%s=%d' % (k, sizes[k]) for k in sorted(sizes)]))
+        size = sizes.popitem()[1]
+
+        state = numpy.zeros(size, dtype=numpy.int8)
+        undecided = numpy.ones(size, dtype=bool)
+        with numpy.errstate(invalid='ignore'):
+            for (condition, severity, metrics) in self.statements:
+                if condition is None:
+                    matched = undecided
+                else:
+                    try:
+                        matched = undecided & numpy.broadcast_to(condition(data), (size, ))
+                    except TypeError:
+                        raise CriteriaError('Cannot evaluate criteria over metric(s) %s; '
+                                            'non-numeric values?' % ', '.join(metrics))
+                state[matched] = severity
+                undecided &= ~matched
+                if not undecided.any():
+                    break
+        return state
+
+
+class BacktestResult(object):
+    """
+    The outcome of evaluating one alarm over a metric history: samples is the number of
+    samples spent in each state, and transitions the number of times the alarm entered each
+    state, both dicts keyed by state name. The alarm is presumed to start out OK.
+    """
+
+    def __init__(self, state):
+        counts = numpy.bincount(state, minlength=len(SEVERITIES))
+        entered = state[numpy.flatnonzero(numpy.diff(state)) + 1]
+        if len(state) and state[0] != OK:
+            entered = numpy.concatenate([state[:1], entered])
+        changes = numpy.bincount(entered, minlength=len(SEVERITIES))
+        self.state = state
+        self.samples = dict([(SEVERITY_NAMES[i], int(counts[i])) for i in SEVERITY_NAMES])
+        self.transitions = dict([(SEVERITY_NAMES[i], int(changes[i])) for i in SEVERITY_NAMES])
+
+
+def load_metrics(path):
+    """
+    Load recorded metrics into a dict of metric name -> numpy array. path is either an .npz
+    file of one array per metric, or a CSV file with a header row of metric names and one
+    row per sample. CSV columns with no numeric cells, other than empty or NULL ones, are
+    loaded as strings. In the others, cells that are not numbers, such as NULL, are loaded as
+    NaN, which compares false to everything.
+    """
+    import csv
+
+    if path.endswith('.npz'):
+        with numpy.load(path, allow_pickle=False) as npz:
+            return dict([(k, npz[k]) for k in npz.files])
+
+    with open(path, 'r') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = []
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                raise CriteriaError('%s, line %d: expected %d columns, got %d' %
+                                    (path, reader.line_num, len(header), len(row)))
+            rows.append(row)
+        columns = list(zip(*rows)) or [()] * len(header)
+
+    def number(v):
+        try:
+            return float(v)
+        except ValueError:
+            return numpy.nan
+
+    data = {}
+    for (name, column) in zip(header, columns):
+        values = numpy.array([number(v) for v in column])
+        if len(values) and numpy.isnan(values).all() and \
+                any([v not in ('', 'NULL') for v in column]):
+            data[name] = numpy.array(column)
+        else:
+            data[name] = values
+    return data
+
+
+def backtest(check, data):
+    """
+    Evaluate each of the check's alerts against the recorded metrics, and return a list of
+    (alert, BacktestResult) tuples.
+    """
+    results = []
+    for alert in check.alerts() or []:
+        program = AlarmProgram('\n'.join(alert.criteria))
+        results.append((alert, BacktestResult(program(data))))
+    return results
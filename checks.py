@@ -38,6 +38,8 @@ class RaxCheck(object):
         'label': None,
     }
 
+    label = None
+
     # None, for all hosts, or a regex that matches hostnames to which the check should be deployed
     host_pattern = None
 
@@ -50,14 +52,22 @@ class RaxCheck(object):
     EXCEPTION = 'EXCEPTION'
     STATUS = 'STATUS'
 
+    # None, or a name distinguishing this check from the others defined by the same module
+    instance = None
+
     metrics = ()
     status = OK
 
-    def __init__(self):
+    def __init__(self, **kwargs):
         """
-        Sugar: assign the value of any of the subclasses' attributes to the
-        _config dict, if the attribute names are present in _config's keys.
+        Sugar: assign any keyword arguments as attributes of the check, then assign the value
+        of any of the subclasses' attributes to the _config dict, if the attribute names are
+        present in _config's keys. This lets one check class be instantiated several times
+        with different parameters, eg. ProcessCheck(label='nginx', name='nginx').
         """
+        for (k, v) in kwargs.items():
+            setattr(self, k, v)
+        self._config = dict(self._config)
         for (k, v) in self._config.items():
             self._config[k] = getattr(self, k, v)
 
@@ -75,11 +85,12 @@ class RaxCheck(object):
 
     def error(self, msg, error_type=None):
         """
-        Add an error to the metrics, and set status to ERROR.
+        Add an error to the metrics, and set status to ERROR. Newlines in msg are replaced
+        with spaces, since each metric must be printed on a single line.
         """
         if not error_type:
             error_type = self.CONFIG_ERROR
-        self.metrics += ((error_type, 'check() not configured', 'string'), )
+        self.metrics += ((error_type, ' '.join(str(msg).splitlines()), 'string'), )
         self.status = self.ERROR
         return (self.status, self.metrics)
 
@@ -135,6 +146,63 @@ class RaxCheck(object):
         print '\n'.join(["metric %s %s %s" % (n, m, v) for (n, v, m) in self.metrics])
 
 
+###########
+# HELPERS #
+###########
+# Utility functions for use in your checks' check() and alerts() methods.
+
+# parsed hosts files, keyed by path; see read_hosts()
+_hosts_cache = {}
+
+
+def interface_address(ifname):
+    """
+    Return the IPv4 address assigned to the named network interface, eg. '192.168.5.2' for
+    'eth2', by asking the kernel directly (SIOCGIFADDR) rather than forking ifconfig.
+    Raises IOError if the interface does not exist or has no IPv4 address.
+    """
+    import fcntl
+    import socket
+    import struct
+
+    SIOCGIFADDR = 0x8915
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ifreq = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', ifname[:15]))
+    finally:
+        s.close()
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+def read_hosts(path='/etc/hosts'):
+    """
+    Parse a hosts file into a dict mapping each IP address to a list of (hostnames, comment)
+    tuples, one per line on which the address appears. The parsed file is cached, and only
+    re-read when its mtime changes.
+
+    Example:
+
+    >>> read_hosts()['127.0.0.1']
+    [(['localhost'], '')]
+    """
+    import os
+
+    mtime = os.stat(path).st_mtime
+    if path in _hosts_cache and _hosts_cache[path][0] == mtime:
+        return _hosts_cache[path][1]
+
+    hosts = {}
+    with open(path, 'r') as f:
+        for l in f:
+            (entry, dummy, comment) = l.partition('#')
+            fields = entry.split()
+            if len(fields) < 2:
+                continue
+            hosts.setdefault(fields[0], []).append((fields[1:], comment.strip()))
+    _hosts_cache[path] = (mtime, hosts)
+    return hosts
+
+
 ################
 # BASIC CHECKS #
 ################
@@ -244,6 +312,342 @@ class FileSystemCheck(RaxCheck):
         ]
 
 
+class _CounterCheck(RaxCheck):
+    """
+    Base class for checks that report rates computed from monotonic kernel counters. Since
+    each plugin run is a new process, the counters from the previous run are persisted in a
+    small JSON state file, and rates are computed from the current sample and the stored one.
+    Nothing is reported for counters that have no stored sample: on the first run, after a
+    reboot, for a counter that has just appeared, or for one that has been reset.
+    """
+
+    # defaults to /var/tmp/raxalert-<class>-<label>[-<instance>].json
+    state_file = None
+
+    def state_path(self):
+        if self.state_file:
+            return self.state_file
+        name = '-'.join([str(n) for n in (type(self).__name__, self.label, self.instance) if n])
+        return '/var/tmp/raxalert-%s.json' % re.sub(r'[^a-z0-9]+', '-', name.lower())
+
+    @staticmethod
+    def read_proc(path):
+        """
+        Return the contents of a /proc file, in a single read.
+        """
+        with open(path, 'r') as f:
+            return f.read()
+
+    def load_state(self):
+        """
+        Return the state saved by the previous run, or None if there is no usable state: if
+        the file is missing or unreadable, or the host has rebooted since it was written.
+        """
+        import json
+
+        try:
+            with open(self.state_path(), 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if state.get('boot_id') != self.boot_id:
+            return None
+        return state
+
+    def save_state(self, counters):
+        """
+        Atomically replace the state file with the current counters.
+        """
+        import json
+        import os
+
+        path = self.state_path()
+        tmp = '%s.%d' % (path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump({'boot_id': self.boot_id, 'time': self.now, 'counters': counters}, f)
+        os.rename(tmp, path)
+
+    @staticmethod
+    def delta(current, previous):
+        """
+        Return the increase of a counter since its previous value, or None if the counter has
+        been reset. A counter that went backwards has only wrapped if it was close to the limit
+        of its width: 32 bits if the previous value fits in 32 bits (eg. the diskstats ms
+        counters on some kernels), otherwise 64 bits. Any other backwards move is a reset, eg.
+        a device re-attached with the same major:minor.
+        """
+        if current >= previous:
+            return current - previous
+        width = 2 ** 32 if previous < 2 ** 32 else 2 ** 64
+        wrapped = current + width - previous
+        if wrapped <= width // 4:
+            return wrapped
+        return None
+
+    def collect(self):
+        """
+        Return a dict of counter sets, each a dict of counter name -> value, for the current
+        sample; subclasses should redefine this.
+        """
+        return {}
+
+    def report(self, current, previous, elapsed):
+        """
+        Add metrics to self.metrics from the current sample. previous is the stored sample
+        (with the same keys as collect() returns), or None, and elapsed is the number of
+        seconds between the two samples. Subclasses should redefine this.
+        """
+        pass
+
+    def check(self):
+        import time
+
+        self.status = self.OK
+        self.now = time.time()
+        self.boot_id = self.read_proc('/proc/sys/kernel/random/boot_id').strip()
+
+        current = self.collect()
+        state = self.load_state()
+        if state and self.now > state['time']:
+            self.report(current, state['counters'], self.now - state['time'])
+        else:
+            self.report(current, None, None)
+        self.save_state(current)
+
+
+class SystemLoadCheck(_CounterCheck):
+    """
+    Collect CPU utilization, load average and memory metrics from /proc/stat, /proc/loadavg
+    and /proc/meminfo. The CPU percentages cover the time since the check last ran, so they
+    are not reported on the first run.
+
+    Example:
+
+    class Check(SystemLoadCheck):
+        cpu_warning = 80
+        cpu_critical = 95
+        memory_critical = 98
+    """
+
+    label = 'System Load'
+
+    # thresholds for the cpu.busy and mem.used_percent metrics
+    cpu_warning = 90
+    cpu_critical = None
+    memory_warning = 90
+    memory_critical = 95
+
+    # the columns of the cpu line in /proc/stat; guest time is already counted in user/nice
+    CPU_FIELDS = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+
+    def collect(self):
+        cpu = {}
+        counters = {}
+        gauges = {}
+        for line in self.read_proc('/proc/stat').splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0] == 'cpu':
+                cpu = dict(zip(self.CPU_FIELDS, [int(v) for v in fields[1:]]))
+            elif fields[0] in ('ctxt', 'processes'):
+                counters[fields[0]] = int(fields[1])
+            elif fields[0] in ('procs_running', 'procs_blocked'):
+                gauges[fields[0]] = int(fields[1])
+
+        meminfo = {}
+        for line in self.read_proc('/proc/meminfo').splitlines():
+            (name, dummy, value) = line.partition(':')
+            meminfo[name] = int(value.split()[0]) * 1024
+
+        self.loadavg = self.read_proc('/proc/loadavg').split()[:3]
+        self.gauges = gauges
+        self.meminfo = meminfo
+        return {'cpu': cpu, 'counters': counters}
+
+    def report(self, current, previous, elapsed):
+        self.metrics += (
+            ('load.1', self.loadavg[0], 'double'),
+            ('load.5', self.loadavg[1], 'double'),
+            ('load.15', self.loadavg[2], 'double'),
+            ('procs.running', self.gauges.get('procs_running', 0), 'uint32'),
+            ('procs.blocked', self.gauges.get('procs_blocked', 0), 'uint32'),
+        )
+
+        # MemAvailable is only provided by linux 3.14 and later
+        mem = self.meminfo
+        total = mem.get('MemTotal', 0) or 1
+        available = mem.get('MemAvailable',
+                            mem.get('MemFree', 0) + mem.get('Buffers', 0) + mem.get('Cached', 0))
+        swap_total = mem.get('SwapTotal', 0)
+        swap_used = swap_total - mem.get('SwapFree', 0)
+        self.metrics += (
+            ('mem.total', total, 'uint64'),
+            ('mem.available', available, 'uint64'),
+            ('mem.used_percent', '%.2f' % (100.0 * (total - available) / total), 'double'),
+            ('swap.total', swap_total, 'uint64'),
+            ('swap.used', swap_used, 'uint64'),
+            ('swap.used_percent', '%.2f' % (100.0 * swap_used / (swap_total or 1)), 'double'),
+        )
+
+        if previous is None:
+            return
+
+        # the kernel's idle and iowait times are known to go backwards slightly at times
+        cpu = dict([(k, self.delta(v, previous['cpu'].get(k, v)) or 0)
+                    for (k, v) in current['cpu'].items()])
+        ticks = float(sum(cpu.values()))
+        if ticks:
+            for k in self.CPU_FIELDS:
+                if k in cpu:
+                    self.metrics += (('cpu.%s' % k, '%.2f' % (100 * cpu[k] / ticks), 'double'), )
+            busy = ticks - cpu.get('idle', 0) - cpu.get('iowait', 0)
+            self.metrics += (('cpu.busy', '%.2f' % (100 * busy / ticks), 'double'), )
+
+        for (k, v) in current['counters'].items():
+            delta = self.delta(v, previous['counters'].get(k, v))
+            if k in previous['counters'] and delta is not None:
+                self.metrics += (('%s_per_sec' % k, '%.2f' % (delta / elapsed), 'double'), )
+
+    def alerts(self):
+        """
+        Default alerts for this check; redefine in subclass if necessary.
+        """
+        criteria = []
+        for (metric, name, thresholds) in [
+            ('cpu.busy', 'CPU usage', [('CRITICAL', self.cpu_critical),
+                                       ('WARNING', self.cpu_warning)]),
+            ('mem.used_percent', 'Memory usage', [('CRITICAL', self.memory_critical),
+                                                  ('WARNING', self.memory_warning)]),
+        ]:
+            for (severity, threshold) in thresholds:
+                if threshold is None:
+                    continue
+                criteria.append(
+                    "if (metric['%s'] > %s) {\n"
+                    "    return new AlarmStatus(%s, '%s is #{%s} percent');\n"
+                    "}" % (metric, threshold, severity, name, metric)
+                )
+        if not criteria:
+            return None
+        criteria.append("return new AlarmStatus(OK, 'CPU and memory usage are normal.');")
+        return [Alert(name='system-load', label='system load', criteria=criteria)]
+
+
+class DiskIOCheck(_CounterCheck):
+    """
+    Collect per-device IOPS, throughput, await and utilization from /proc/diskstats. Rates
+    cover the time since the check last ran, so a device is only reported once it has been
+    present for two consecutive runs; devices that are added or removed are picked up or
+    dropped on the next run.
+
+    By default, whole disks matching device_pattern are reported; set devices to a list of
+    device names to report only those, and to enable the await and utilization alerts.
+
+    Example:
+
+    class Check(DiskIOCheck):
+        devices = ['xvda', 'xvdb']
+        await_warning = 50
+    """
+
+    label = 'Disk IO'
+
+    devices = None
+    device_pattern = re.compile(r'^(sd[a-z]+|xvd[a-z]+|vd[a-z]+|nvme\d+n\d+|md\d+)$')
+
+    # thresholds for the <device>.await (ms) and <device>.util (percent) metrics
+    await_warning = None
+    await_critical = None
+    util_warning = 90
+    util_critical = None
+
+    # the 512-byte sector counts in /proc/diskstats are always in these units
+    SECTOR_SIZE = 512
+
+    # the columns of /proc/diskstats used, after major, minor and device name
+    DISKSTATS_FIELDS = ('reads', 'reads_merged', 'sectors_read', 'read_ms',
+                        'writes', 'writes_merged', 'sectors_written', 'write_ms',
+                        'in_progress', 'io_ms', 'weighted_io_ms')
+
+    def collect(self):
+        devices = {}
+        for line in self.read_proc('/proc/diskstats').splitlines():
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            name = fields[2]
+            if self.devices is not None:
+                if name not in self.devices:
+                    continue
+            elif not self.device_pattern.match(name):
+                continue
+            stats = dict(zip(self.DISKSTATS_FIELDS, [int(v) for v in fields[3:14]]))
+            stats['dev'] = '%s:%s' % (fields[0], fields[1])
+            devices[name] = stats
+        return devices
+
+    def report(self, current, previous, elapsed):
+        self.metrics += (('devices', ' '.join(sorted(current)), 'string'), )
+        if previous is None:
+            return
+
+        for (name, stats) in sorted(current.items()):
+            # a device that is new, or was replaced by another with the same name
+            prev = previous.get(name)
+            if prev is None or prev.get('dev') != stats['dev']:
+                continue
+
+            d = dict([(k, self.delta(stats[k], prev[k])) for k in self.DISKSTATS_FIELDS
+                      if k != 'in_progress'])
+
+            # the device's counters were reset, eg. by re-attaching it; skip it until next run
+            if None in d.values():
+                continue
+            ios = d['reads'] + d['writes']
+            self.metrics += (
+                ('%s.read_iops' % name, '%.2f' % (d['reads'] / elapsed), 'double'),
+                ('%s.write_iops' % name, '%.2f' % (d['writes'] / elapsed), 'double'),
+                ('%s.read_bytes_per_sec' % name,
+                 '%.2f' % (d['sectors_read'] * self.SECTOR_SIZE / elapsed), 'double'),
+                ('%s.write_bytes_per_sec' % name,
+                 '%.2f' % (d['sectors_written'] * self.SECTOR_SIZE / elapsed), 'double'),
+                ('%s.await' % name,
+                 '%.2f' % (float(d['read_ms'] + d['write_ms']) / ios if ios else 0), 'double'),
+                ('%s.util' % name,
+                 '%.2f' % min(100.0, d['io_ms'] / (elapsed * 10)), 'double'),
+                ('%s.in_progress' % name, stats['in_progress'], 'uint32'),
+            )
+
+    def alerts(self):
+        """
+        Default alerts for this check; only generated when devices is set.
+        """
+        if not self.devices:
+            return None
+        criteria = []
+        for (metric, name, units, thresholds) in [
+            ('await', 'IO wait', 'ms', [('CRITICAL', self.await_critical),
+                                        ('WARNING', self.await_warning)]),
+            ('util', 'utilization', '%', [('CRITICAL', self.util_critical),
+                                          ('WARNING', self.util_warning)]),
+        ]:
+            for (severity, threshold) in thresholds:
+                if threshold is None:
+                    continue
+                for device in self.devices:
+                    criteria.append(
+                        "if (metric['%s.%s'] > %s) {\n"
+                        "    return new AlarmStatus(%s, '%s %s is #{%s.%s}%s');\n"
+                        "}" % (device, metric, threshold, severity, device, name,
+                               device, metric, units)
+                    )
+        if not criteria:
+            return None
+        criteria.append("return new AlarmStatus(OK, 'Disk IO is normal.');")
+        return [Alert(name='disk-io', label='disk io', criteria=criteria)]
+
+
 class FileSizeCheck(RaxCheck):
     """
     Check that the size of a given file is between min_file_size and max_file_size.
@@ -406,7 +810,10 @@ class MySQLReplicationCheck(RaxCheck):
     """
     Check on the status of a MySQL replica set. By default, only checks on the slave status,
     but can be made to auto-detect by overriding the is_master() method to return True if
-    run on your master; see examples/mysql-replication.py.
+    run on your master; see alerts/mysql-replication.py.
+
+    All of the status queries are sent to the server in a single invocation of the mysql CLI,
+    so the check costs one connection and one round trip regardless of the node's role.
 
     Example, presuming two db nodes, 'db-master' and 'db-slave':
 
@@ -425,6 +832,19 @@ class MySQLReplicationCheck(RaxCheck):
     slave_behind_critical = 5
     host_pattern = None
 
+    # SHOW GLOBAL STATUS counters to report, as (variable name, metric type)
+    global_status = (
+        ('Uptime', 'uint64'),
+        ('Threads_connected', 'uint32'),
+        ('Threads_running', 'uint32'),
+        ('Slave_open_temp_tables', 'uint32'),
+        ('Slave_retried_transactions', 'uint64'),
+        ('Binlog_cache_disk_use', 'uint64'),
+    )
+
+    # column name of the marker row that precedes each result set in the batched output
+    RESULT_MARKER = '__raxalert_result__'
+
     def is_master(self):
         """
         Return True if the current host should be checked as the MySQL master; you
@@ -432,6 +852,15 @@ class MySQLReplicationCheck(RaxCheck):
         """
         return False
 
+    @property
+    def master(self):
+        """
+        Sugar: the result of is_master(), which is only called once per check instance.
+        """
+        if not hasattr(self, '_master'):
+            self._master = self.is_master()
+        return self._master
+
     def _mysql(self, cmd):
         """
         Execute an sql command via the mysql CLI and parse the output rows into a list of dicts.
@@ -449,27 +878,137 @@ class MySQLReplicationCheck(RaxCheck):
         if status or not stdout:
             self.error('There was an error (%d):\n%s' % (status, stderr))
             return None
-        return list(csv.DictReader(StringIO(stdout), delimiter='\t', quoting=csv.QUOTE_NONE))
+        return list(csv.DictReader(StringIO.StringIO(stdout), delimiter='\t',
+                                   quoting=csv.QUOTE_NONE))
+
+    def _mysql_batch(self, queries):
+        """
+        Execute several sql statements in one invocation of the mysql CLI, and return a dict
+        mapping each query's name to its list of row dicts. queries is a sequence of
+        (name, sql) tuples.
+
+        In batch mode the CLI prints each result set as a header line followed by its rows,
+        with nothing in between, and prints nothing at all for an empty result. So each
+        statement is preceded by a one-row SELECT of its name under RESULT_MARKER, which
+        lets parse_results() tell where one result set ends and the next begins.
+        """
+        statements = []
+        for (name, sql) in queries:
+            statements.append("SELECT '%s' AS %s" % (name, self.RESULT_MARKER))
+            statements.append(sql)
+
+        (status, stdout, stderr) = self.shell(
+            sh.mysql,
+            '--defaults-file=/root/.my.cnf',
+            '-B',
+            '-e %s' % '; '.join(statements),
+        )
+        if status or not stdout:
+            self.error('There was an error (%d):\n%s' % (status, stderr))
+            return None
+        return self.parse_results(stdout)
+
+    def parse_results(self, output):
+        """
+        Parse the batched output of _mysql_batch() into a dict of result set name -> rows.
+        Result sets that returned no rows are present, as empty lists.
+        """
+        results = {}
+        rows = None
+        header = None
+        lines = iter(output.splitlines())
+        for line in lines:
+            if line == self.RESULT_MARKER:
+                rows = results.setdefault(next(lines, ''), [])
+                header = None
+            elif rows is None:
+                continue
+            elif header is None:
+                header = line.split('\t')
+            else:
+                rows.append(dict(zip(header, line.split('\t'))))
+        return results
+
+    @staticmethod
+    def parse_gtid_set(gtid_set):
+        """
+        Parse a GTID set such as 'uuid:1-5:7,uuid2:1-3' into a dict of uuid -> [(start, end)].
+        """
+        intervals = {}
+        for member in (gtid_set or '').replace('\\n', '').replace('\n', '').split(','):
+            member = member.strip()
+            if not member:
+                continue
+            parts = member.split(':')
+            ranges = intervals.setdefault(parts[0].lower(), [])
+            for r in parts[1:]:
+                (start, dummy, end) = r.partition('-')
+                ranges.append((int(start), int(end or start)))
+        return intervals
+
+    def gtid_lag(self, retrieved, executed):
+        """
+        Return the number of transactions in the retrieved GTID set that are not yet in the
+        executed GTID set, ie. the transactions waiting in the relay log.
+        """
+        executed = self.parse_gtid_set(executed)
+        lag = 0
+        for (uuid, ranges) in self.parse_gtid_set(retrieved).items():
+            for (start, end) in ranges:
+                lag += end - start + 1
+                for (e_start, e_end) in executed.get(uuid, []):
+                    lag -= max(0, min(end, e_end) - max(start, e_start) + 1)
+        return lag
+
+    def queries(self):
+        """
+        Return the statements sent to the server on each run, as (result set name, sql) tuples.
+        """
+        names = ', '.join(["'%s'" % name for (name, metric_type) in self.global_status])
+        return [
+            ('slave_status', 'SHOW SLAVE STATUS'),
+            ('global_status', 'SHOW GLOBAL STATUS WHERE Variable_name IN (%s)' % names),
+            ('binlog_dump', "SELECT HOST AS Host, STATE AS State, TIME AS Time "
+                            "FROM information_schema.PROCESSLIST "
+                            "WHERE COMMAND LIKE 'Binlog Dump%'"),
+        ]
 
     def check(self):
         """
-        Determine whether the current host is the master or slave, and invoke the correct check.
+        Collect all of the replication status in one round trip, determine whether the current
+        host is the master or slave, and invoke the correct check.
         """
-        return self.check_master() if self.is_master() else self.check_slave()
+        results = self._mysql_batch(self.queries())
+        if results is None:
+            return
+
+        self.status = self.OK
+        self.check_global_status(results.get('global_status', []))
+        if self.master:
+            return self.check_master(results.get('binlog_dump', []))
+        return self.check_slave(results.get('slave_status', []))
 
-    def check_master(self):
+    def check_global_status(self, rows):
+        """
+        Add the configured SHOW GLOBAL STATUS counters to the metrics.
+        """
+        values = dict([(row['Variable_name'], row['Value']) for row in rows])
+        for (name, metric_type) in self.global_status:
+            if name in values:
+                self.metrics += (('status.%s' % name.lower(), values[name], metric_type), )
+
+    def check_master(self, rows):
         """
         Check on the status of the master node, by ensuring we have at least one slave connection.
         """
-        rows = self._mysql('SHOW PROCESSLIST')
-        if not rows:
-            return
         slaves = []
-        for row in rows:
-            if 'Command' not in row or 'Binlog Dump' not in row['Command']:
-                continue
-            else:
-                slaves.append(row['Host'])
+        for (i, row) in enumerate(rows):
+            slaves.append(row['Host'])
+            self.metrics += (
+                ('slaves.%d.host' % i, row['Host'], 'string'),
+                ('slaves.%d.state' % i, row['State'] or 'NULL', 'string'),
+                ('slaves.%d.time' % i, row['Time'], 'uint32'),
+            )
 
         if slaves == []:
             self.error('No slave connections!')
@@ -480,28 +1019,59 @@ class MySQLReplicationCheck(RaxCheck):
         )
         return (self.status, self.metrics)
 
-    def check_slave(self):
+    def check_slave(self, rows):
         """
         Check that the slave is running and successfully replicating the master.
         """
-        rows = self._mysql('SHOW SLAVE STATUS')
         if not rows:
-            return
+            return self.error('Replication is not configured on this host!')
         row = rows[0]
 
         if row['Slave_IO_Running'] == 'Yes' and row['Slave_SQL_Running'] == 'Yes':
             online = 'ONLINE'
         else:
             online = 'OFFLINE'
+
+        # Seconds_Behind_Master is NULL when the SQL thread is not running
+        seconds_behind = row['Seconds_Behind_Master']
+        if seconds_behind == 'NULL':
+            seconds_behind = -1
+
         self.metrics += (
             ('slave.status', online, 'string'),
-            ('slave.seconds_behind', row['Seconds_Behind_Master'], 'int32'),
+            ('slave.io_running', row['Slave_IO_Running'], 'string'),
+            ('slave.sql_running', row['Slave_SQL_Running'], 'string'),
+            ('slave.io_state', row['Slave_IO_State'] or 'NULL', 'string'),
+            ('slave.seconds_behind', seconds_behind, 'int32'),
             ('slave.last_error', row['Last_Errno'], 'int32'),
+            ('slave.relay_log_space', row['Relay_Log_Space'], 'uint64'),
+            ('slave.master_log_file', row['Master_Log_File'], 'string'),
+            ('slave.read_master_log_pos', row['Read_Master_Log_Pos'], 'uint64'),
+            ('slave.relay_master_log_file', row['Relay_Master_Log_File'], 'string'),
+            ('slave.exec_master_log_pos', row['Exec_Master_Log_Pos'], 'uint64'),
         )
 
+        # the position lag is only meaningful while both threads are on the same binlog file
+        if row['Master_Log_File'] == row['Relay_Master_Log_File']:
+            self.metrics += ((
+                'slave.log_pos_behind',
+                int(row['Read_Master_Log_Pos']) - int(row['Exec_Master_Log_Pos']),
+                'int64'
+            ), )
+
+        # GTID replication is only reported by MySQL 5.6 and later
+        if 'Retrieved_Gtid_Set' in row:
+            if row.get('Slave_SQL_Running_State'):
+                self.metrics += (('slave.sql_state', row['Slave_SQL_Running_State'], 'string'), )
+            self.metrics += ((
+                'slave.gtid_behind',
+                self.gtid_lag(row['Retrieved_Gtid_Set'], row['Executed_Gtid_Set']),
+                'uint64'
+            ), )
+
     def alerts(self):
 
-        if self.is_master():
+        if self.master:
             alerts = [Alert(name='mysql-replication', label='MySQL master', criteria=[
                 "if (metric['slaves.connected'] == 0) {\n"
                 "    return new AlarmStatus(CRITICAL, 'All MySQL slaves are offline!');\n"
@@ -522,3 +1092,433 @@ class MySQLReplicationCheck(RaxCheck):
                 "return new AlarmStatus(OK, 'MySQL slave is online.');"
             ])]
         return alerts
+
+
+class _Probe(object):
+    """
+    A single non-blocking connection attempt to a (family, address) pair, optionally followed
+    by sending a request and reading the response until the peer closes the connection or
+    max_response bytes have been read. Driven by TcpPortCheck.probe_all().
+    """
+
+    def __init__(self, family, address, request=None, max_response=65536):
+        import errno
+        import socket
+        import time
+
+        self.request = request
+        self.max_response = max_response
+        self.response = b''
+        self.connect_time = None
+        self.ttfb = None
+        self.error = None
+        self.done = False
+
+        # whether the sample was successful; set by TcpPortCheck.target_metrics()
+        self.ok = None
+
+        self.start = time.time()
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.setblocking(0)
+        err = self.sock.connect_ex(address)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.fail(errno.errorcode.get(err, err))
+
+    @property
+    def connecting(self):
+        return self.connect_time is None
+
+    @property
+    def writing(self):
+        """
+        True if the probe is waiting for the socket to become writable.
+        """
+        return self.connecting or bool(self.request)
+
+    def fail(self, error):
+        self.error = str(error)
+        self.finish()
+
+    def finish(self):
+        self.done = True
+        self.sock.close()
+
+    def on_writable(self, now):
+        import errno
+        import socket
+
+        if self.connecting:
+            err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                return self.fail(errno.errorcode.get(err, err))
+            self.connect_time = now - self.start
+            if self.request is None:
+                return self.finish()
+        try:
+            sent = self.sock.send(self.request)
+        except socket.error as e:
+            return self.fail(e)
+        self.request = self.request[sent:]
+
+    def on_readable(self, now):
+        import socket
+
+        try:
+            data = self.sock.recv(self.max_response - len(self.response))
+        except socket.error as e:
+            return self.fail(e)
+        if data and self.ttfb is None:
+            self.ttfb = now - self.start
+        self.response += data
+        if not data or len(self.response) >= self.max_response:
+            self.finish()
+
+
+class TcpPortCheck(RaxCheck):
+    """
+    Check that a list of 'host:port' targets accept TCP connections. All of the targets are
+    probed concurrently, each one samples times in a row, and the whole run is bounded by
+    deadline seconds; any probe still outstanding at the deadline counts as a failure.
+
+    For each target, reports the percentage of successful samples, and the min, p50, p95 and
+    max connect latency in milliseconds. Target metric names are the target with runs of
+    non-alphanumeric characters replaced by '_', eg. 'db01_3306.connect.p95'.
+
+    Example:
+
+    class Check(TcpPortCheck):
+        label = 'memcached'
+        targets = ['cache01:11211', 'cache02:11211']
+        latency_warning = 50
+        latency_critical = 200
+    """
+
+    label = 'TCP Ports'
+    targets = []
+
+    samples = 3
+    deadline = 10
+
+    # bytes of the response to read, when request() returns something to send
+    max_response = 64 * 1024
+
+    # alert thresholds; the latency thresholds are in ms, and compared to the p95 latency
+    availability_warning = 100
+    availability_critical = 50
+    latency_warning = None
+    latency_critical = None
+
+    # the latency metric compared to the latency thresholds
+    latency_metric = 'connect'
+
+    def metric_name(self, target):
+        """
+        Return the prefix used for a target's metric names.
+        """
+        return re.sub(r'[^A-Za-z0-9]+', '_', target).strip('_')
+
+    def address(self, target):
+        """
+        Return the (host, port) to connect to for the specified target.
+        """
+        (host, dummy, port) = target.rpartition(':')
+        return (host.strip('[]'), int(port))
+
+    def request(self, target):
+        """
+        Return the bytes to send to the target once connected, or None to only connect.
+        """
+        return None
+
+    def sample_ok(self, target, probe):
+        """
+        Return None if the completed probe counts as a successful sample, or an error message.
+        """
+        return probe.error
+
+    @staticmethod
+    def percentile(values, p):
+        """
+        Return the p-th percentile of a sorted list of values, by the nearest-rank method.
+        """
+        import math
+        return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+    def resolve_all(self, end):
+        """
+        Look up the addresses of all of the targets concurrently, giving up at the time end.
+        Returns a dict of target -> list of (family, address) tuples, in the order returned by
+        getaddrinfo(), or an error message if the target could not be resolved in time.
+        """
+        import socket
+        import threading
+        import time
+
+        results = {}
+
+        def resolve(target):
+            try:
+                (host, port) = self.address(target)
+                addresses = []
+                for (family, dummy, dummy, dummy, address) in socket.getaddrinfo(
+                        host, port, 0, socket.SOCK_STREAM):
+                    if (family, address) not in addresses:
+                        addresses.append((family, address))
+                results[target] = addresses
+            except (socket.error, ValueError) as e:
+                results[target] = str(e)
+
+        # getaddrinfo() blocks, and cannot be interrupted; lookups still running at the
+        # deadline are abandoned to their (daemon) threads.
+        threads = []
+        for target in self.targets:
+            t = threading.Thread(target=resolve, args=(target, ))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join(max(0, end - time.time()))
+        return dict([(t, results.get(t, 'deadline exceeded')) for t in self.targets])
+
+    def probe_all(self):
+        """
+        Probe every target samples times, concurrently across targets, until all of the samples
+        have been taken or the deadline passes. Returns a dict of target -> completed probes.
+
+        If a target resolves to several addresses (eg. 'localhost' to both ::1 and 127.0.0.1),
+        a sample whose connection fails is retried on the next address, and the first address
+        that accepts a connection is used for the target's remaining samples. Only the
+        successful attempt counts towards the sample's connect latency.
+        """
+        import select
+        import time
+
+        end = time.time() + self.deadline
+        probes = dict([(t, []) for t in self.targets])
+
+        # resolve all of the targets up front, so lookups are not counted as connect latency
+        addresses = {}
+        for (target, address) in self.resolve_all(end).items():
+            if isinstance(address, list):
+                addresses[target] = address
+            else:
+                probes[target] = [None] * self.samples
+                self.metrics += (('%s.error' % self.metric_name(target), address, 'string'), )
+
+        # the index of the address to use for each target's next sample
+        current = dict([(t, 0) for t in addresses])
+
+        def start(target, index=None):
+            if index is None:
+                index = current[target]
+            (family, address) = addresses[target][index]
+            p = _Probe(family, address, self.request(target), self.max_response)
+            p.address_index = index
+            probes[target].append(p)
+            return p
+
+        active = dict([(t, start(t)) for t in addresses])
+        while active:
+            for (target, p) in list(active.items()):
+                if p.done:
+                    if p.connect_time is not None:
+                        current[target] = p.address_index
+                    elif p.address_index + 1 < len(addresses[target]):
+                        # the connection failed; retry this sample on the next address
+                        probes[target].pop()
+                        active[target] = start(target, p.address_index + 1)
+                        continue
+                    if len(probes[target]) < self.samples:
+                        active[target] = start(target)
+                    else:
+                        del active[target]
+            if not active:
+                break
+
+            timeout = end - time.time()
+            if timeout <= 0:
+                for p in active.values():
+                    p.fail('deadline exceeded')
+                break
+
+            readers = [p.sock for p in active.values() if not p.writing]
+            writers = [p.sock for p in active.values() if p.writing]
+            (readable, writable, dummy) = select.select(readers, writers, [], timeout)
+            now = time.time()
+            by_sock = dict([(p.sock, p) for p in active.values()])
+            for sock in writable:
+                by_sock[sock].on_writable(now)
+            for sock in readable:
+                by_sock[sock].on_readable(now)
+
+        # samples that were never started before the deadline are failures, too
+        for target in addresses:
+            probes[target] += [None] * (self.samples - len(probes[target]))
+        return probes
+
+    def latency_metrics(self, name, values):
+        """
+        Return min/p50/p95/max metrics, in ms, for a list of latencies in seconds.
+        """
+        values = sorted([v * 1000.0 for v in values])
+        if not values:
+            return ()
+        return (
+            ('%s.min' % name, '%.3f' % values[0], 'double'),
+            ('%s.p50' % name, '%.3f' % self.percentile(values, 50), 'double'),
+            ('%s.p95' % name, '%.3f' % self.percentile(values, 95), 'double'),
+            ('%s.max' % name, '%.3f' % values[-1], 'double'),
+        )
+
+    def target_metrics(self, target, probes):
+        """
+        Return the metrics for one target, given its probes; None marks a sample not taken.
+        """
+        name = self.metric_name(target)
+        ok = []
+        error = None
+        for p in probes:
+            if p is None:
+                continue
+            sample_error = self.sample_ok(target, p)
+            p.ok = sample_error is None
+            if p.ok:
+                ok.append(p)
+            else:
+                error = sample_error
+        metrics = (
+            ('%s.available' % name, '%.1f' % (100.0 * len(ok) / self.samples), 'double'),
+        )
+        metrics += self.latency_metrics('%s.connect' % name, [p.connect_time for p in ok])
+        if error:
+            metrics += (('%s.error' % name, error, 'string'), )
+        return metrics
+
+    def check(self):
+        if not self.targets:
+            return self.error('No targets configured!')
+
+        self.status = self.OK
+        up = 0
+        for (target, probes) in self.probe_all().items():
+            self.metrics += self.target_metrics(target, probes)
+            if [p for p in probes if p is not None and p.ok]:
+                up += 1
+        self.metrics += (
+            ('targets.total', len(self.targets), 'uint32'),
+            ('targets.up', up, 'uint32'),
+        )
+
+    def alerts(self):
+        """
+        Default alerts for this check; redefine in subclass if necessary.
+        """
+        availability = []
+        latency = []
+        for (severity, threshold) in [('CRITICAL', self.availability_critical),
+                                      ('WARNING', self.availability_warning)]:
+            if threshold is None:
+                continue
+            for target in self.targets:
+                availability.append(
+                    "if (metric['%s.available'] < %s) {\n"
+                    "    return new AlarmStatus(%s, '%s is unavailable "
+                    "(#{%s.available}%% of samples ok)');\n"
+                    "}" % (self.metric_name(target), threshold, severity, target,
+                           self.metric_name(target))
+                )
+        for (severity, threshold) in [('CRITICAL', self.latency_critical),
+                                      ('WARNING', self.latency_warning)]:
+            if threshold is None:
+                continue
+            for target in self.targets:
+                metric = '%s.%s.p95' % (self.metric_name(target), self.latency_metric)
+                latency.append(
+                    "if (metric['%s'] > %s) {\n"
+                    "    return new AlarmStatus(%s, '%s p95 latency is #{%s}ms');\n"
+                    "}" % (metric, threshold, severity, target, metric)
+                )
+
+        alerts = []
+        if availability:
+            availability.append("return new AlarmStatus(OK, 'All targets are available.');")
+            alerts.append(Alert(name='availability', label='%s availability' % self.label,
+                                criteria=availability))
+        if latency:
+            latency.append("return new AlarmStatus(OK, 'Latency is within thresholds.');")
+            alerts.append(Alert(name='latency', label='%s latency' % self.label,
+                                criteria=latency))
+        return alerts
+
+
+class HttpCheck(TcpPortCheck):
+    """
+    Check that a list of 'http://host[:port]/path' URLs respond to a GET with expected_status,
+    and, if body_pattern is set, that the response body matches it. Like TcpPortCheck, all of
+    the URLs are probed concurrently within deadline seconds, and in addition to the connect
+    latency the time to first byte of the response (TTFB) is reported, in milliseconds from
+    the start of the connection. https:// is not supported.
+
+    Example:
+
+    class Check(HttpCheck):
+        label = 'API'
+        targets = ['http://localhost:8080/health']
+        body_pattern = r'"status":\s*"ok"'
+        latency_warning = 250
+    """
+
+    label = 'HTTP'
+
+    expected_status = 200
+    body_pattern = None
+
+    latency_metric = 'ttfb'
+
+    def address(self, target):
+        import urlparse
+        url = urlparse.urlparse(target)
+        if url.scheme != 'http':
+            raise ValueError('Unsupported URL scheme: %s' % url.scheme)
+        return (url.hostname, url.port or 80)
+
+    def request(self, target):
+        """
+        Build an HTTP/1.0 GET for the target, so the response is never chunked and the server
+        closes the connection when it is done.
+        """
+        import urlparse
+        url = urlparse.urlparse(target)
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        return ('GET %s HTTP/1.0\r\nHost: %s\r\nUser-Agent: raxalert\r\n'
+                'Connection: close\r\n\r\n' % (path, url.netloc)).encode('ascii')
+
+    def parse_response(self, response):
+        """
+        Return the (status code, body) of a raw HTTP response; status is None if unparseable.
+        """
+        (head, dummy, body) = response.partition(b'\r\n\r\n')
+        m = re.match(br'HTTP/\d\.\d (\d{3})', head)
+        return (int(m.group(1)) if m else None, body)
+
+    def sample_ok(self, target, probe):
+        if probe.error:
+            return probe.error
+        (status, body) = self.parse_response(probe.response)
+        if status != self.expected_status:
+            return 'Unexpected HTTP status: %s' % status
+        if self.body_pattern and not re.search(self.body_pattern, body.decode('utf-8', 'replace')):
+            return 'Response body does not match %s' % self.body_pattern
+        return None
+
+    def target_metrics(self, target, probes):
+        metrics = super(HttpCheck, self).target_metrics(target, probes)
+        name = self.metric_name(target)
+        done = [p for p in probes if p is not None and not p.error]
+        metrics += self.latency_metrics('%s.ttfb' % name, [p.ttfb for p in done if p.ok])
+        if done:
+            (status, body) = self.parse_response(done[-1].response)
+            metrics += (('%s.http_status' % name, status or 0, 'int32'), )
+        return metrics
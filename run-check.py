@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import os
+import re
 import sys
 import imp
 import click
@@ -53,7 +54,10 @@ def dump_config(check, path):
     # tell rackspace-monitor how to invoke the check, which is done by invoking the bash wrapper
     # script which is installed as a rackspace-monitoring-agent plugin, which in turn loads the
     # virtual env and executes this script.
-    config['details'] = {'file': 'alert-wrapper.sh', 'args': [os.path.abspath(path)]}
+    args = [os.path.abspath(path)]
+    if check.instance:
+        args.append(check.instance)
+    config['details'] = {'file': 'alert-wrapper.sh', 'args': args}
 
     # add the alerts, if there are any
     alerts = check.alerts()
@@ -66,12 +70,102 @@ def dump_config(check, path):
 
 def load(path):
     """
-    dynamically load the 'Check' class from the specified file, and instantiate it
+    dynamically load the specified file and return a list of the check instances it defines.
+
+    A module either defines a 'Check' class, which is instantiated once, or 'checks', a list,
+    tuple or generator of check instances, or a function returning (or yielding) them, eg.:
+
+    checks = [ProcessCheck(label=name, name=name) for name in ('nginx', 'memcached')]
+
+    (A module that does 'import checks' has the library module as its 'checks' attribute;
+    that is ignored, and the module's Check class is used.)
+
+    Each check defined by 'checks' must have a distinct instance name, whatever their number;
+    it defaults to the check's label, lowercased with runs of other characters replaced by
+    '-'; checks without a label must be given an instance name. The instance name is part of
+    the check's config file name, and of the default state_file of checks that keep state
+    between runs, such as DiskIOCheck.
+
+    Returns an empty list if the module defines neither.
     """
+    import inspect
+
     mod_name, file_ext = os.path.splitext(os.path.split(path)[-1])
     module = imp.load_source(mod_name, path)
-    check = getattr(module, 'Check')()
-    return check
+
+    checks = getattr(module, 'checks', None)
+    if isinstance(checks, (list, tuple)) or inspect.isgenerator(checks) or \
+            inspect.isfunction(checks):
+        if inspect.isfunction(checks):
+            checks = checks()
+        checks = list(checks)
+        for check in checks:
+            if not check.instance and check.label:
+                check.instance = re.sub(r'[^a-z0-9]+', '-', str(check.label).lower()).strip('-')
+            if not check.instance:
+                raise Exception("%s has no label; give it a name with instance=" %
+                                type(check).__name__)
+        names = [check.instance for check in checks]
+        duplicates = sorted(set([n for n in names if names.count(n) > 1]))
+        if duplicates:
+            raise Exception("duplicate check instance names: %s" % ', '.join(duplicates))
+    elif hasattr(module, 'Check'):
+        checks = [module.Check()]
+    else:
+        checks = []
+    return checks
+
+
+def select(checks, path, instance=None):
+    """
+    Return the check with the specified instance name from a list returned by load(). The
+    instance name may be omitted if there is only one check.
+    """
+    if not checks:
+        raise click.UsageError("%s does not define a Check class or checks" % path)
+    if instance is None:
+        if len(checks) == 1:
+            return checks[0]
+        raise click.UsageError("%s defines several checks; specify one of: %s" %
+                               (path, ', '.join([c.instance for c in checks])))
+    for check in checks:
+        if check.instance == instance:
+            return check
+    raise click.UsageError("%s does not define a check named '%s'" % (path, instance))
+
+
+def module_configs(check_file, checks):
+    """
+    Return a list of (config file name, YAML config) tuples for the checks loaded from the
+    specified file that should be deployed on the current host.
+    """
+    configs = []
+    for check in checks:
+        # modules defining several checks get one config per check instance
+        cfgfile = os.path.basename(check_file)[:-len('.py')]
+        if check.instance:
+            cfgfile += '-%s' % check.instance
+        cfgfile += '.yaml'
+
+        # if the check has a host_pattern defined, and the current hostname
+        # does not match said pattern, do not deploy this check.
+        if check.host_pattern is not None and not check.host_pattern.search(hostname):
+            print "%s: %s does not match '%s'; skipping" % (
+                check.label, hostname, check.host_pattern.pattern
+            )
+            continue
+
+        config = dump_config(check, check_file)
+
+        # if the output isn't well-formed YAML, don't write it to disk.
+        try:
+            yaml.load(config)
+        except:
+            raise Exception("Invalid plugin config for %s!\n%s" %
+                            (check, config))
+
+        configs.append((cfgfile, config))
+    return configs
 
 
 @click.group()
@@ -81,11 +175,13 @@ def main():
 
 @main.command()
 @click.argument('path', type=click.Path(exists=True))
-def run(path):
+@click.argument('instance', required=False)
+def run(path, instance):
     """
-    Run a check and print its metrics on STDOUT, errors on STDERR.
+    Run a check and print its metrics on STDOUT, errors on STDERR. If the file defines
+    several checks, INSTANCE selects the one to run.
     """
-    check = load(path)
+    check = select(load(path), path, instance)
     if check.conf.disabled:
         print "Check is disabled; skipping.\n"
     else:
@@ -94,12 +190,46 @@ def run(path):
 
 @main.command()
 @click.argument('path', type=click.Path(exists=True))
-def dump(path):
+@click.argument('instance', required=False)
+def dump(path, instance):
+    """
+    Print a plugin configuration for the specified check, in YAML. Stupid YAML. If the
+    file defines several checks, all are printed unless INSTANCE selects one.
+    """
+    checks = load(path)
+    if instance is not None or not checks:
+        checks = [select(checks, path, instance)]
+    print '---\n'.join([dump_config(check, path) for check in checks])
+
+
+@main.command()
+@click.argument('path', type=click.Path(exists=True))
+@click.argument('history', type=click.Path(exists=True))
+@click.option('--instance', help='the check to evaluate, if the file defines several')
+def backtest(path, history, instance):
     """
-    Print a plugin configuration for the specified check, in YAML. Stupid YAML.
+    Evaluate a check's alarms against recorded metrics, in a .csv or .npz file, and report
+    how often each alarm would have changed state.
     """
-    check = load(path)
-    print dump_config(check, path)
+    import time
+    import backtest
+
+    check = select(load(path), path, instance)
+    data = backtest.load_metrics(history)
+    samples = len(next(iter(data.values()))) if data else 0
+
+    start = time.time()
+    results = backtest.backtest(check, data)
+    elapsed = time.time() - start
+
+    for (alert, result) in results:
+        print "%s (%s):" % (alert.name, alert.label)
+        for state in ('WARNING', 'CRITICAL', 'OK'):
+            print "  %-8s %d transitions, %d samples (%.2f%%)" % (
+                state, result.transitions[state], result.samples[state],
+                100.0 * result.samples[state] / (samples or 1)
+            )
+    print "Evaluated %d alarm(s) over %d samples in %.3fs" % (len(results), samples, elapsed)
 
 
 @main.command()
@@ -117,47 +247,41 @@ def collect(path, outdir):
         os.makedirs(outdir)
 
     count = 0
+    errors = 0
     for check_file in iglob('%s/*.py' % path):
-        cfgfile = os.path.basename(check_file.replace('.py', '.yaml'))
-        tmpfile = os.path.join(tmpdir, cfgfile)
-
+        # render all of a module's configs before writing any of them, so that a module
+        # that fails to load or render is skipped as a whole, without stopping the collection.
         try:
-            check = load(check_file)
-        except AttributeError:
-            continue
-
-        # if the check has a host_pattern defined, and the current hostname
-        # does not match said pattern, do not deploy this check.
-        if check.host_pattern is not None and not check.host_pattern.search(hostname):
-            print "%s: %s does not match '%s'; skipping" % (
-                check.label, hostname, check.host_pattern.pattern
-            )
+            checks = load(check_file)
+            if not checks:
+                print "%s: no checks defined; skipping" % check_file
+                continue
+            configs = module_configs(check_file, checks)
+        except Exception as e:
+            print >> sys.stderr, "%s: %s; skipping" % (check_file, e)
+            errors += 1
             continue
 
-        config = dump_config(check, check_file)
-
-        # if the output isn't well-formed YAML, don't write it to disk.
-        try:
-            yaml.load(config)
-        except:
-            raise Exception("Invalid plugin config for %s!\n%s" %
-                            (check, config))
+        for (cfgfile, config) in configs:
+            tmpfile = os.path.join(tmpdir, cfgfile)
 
-        # write the config to a temporary file
-        with open(tmpfile, 'wb') as f:
-            f.write(config)
+            # write the config to a temporary file
+            with open(tmpfile, 'wb') as f:
+                f.write(config)
 
-        count += 1
+            count += 1
 
-        # move the temporary file into place and make sure it is readable
-        if outdir:
-            outfile = os.path.join(outdir, cfgfile)
-            os.rename(tmpfile, outfile)
-            os.chmod(outfile, 0644)
+            # move the temporary file into place and make sure it is readable
+            if outdir:
+                outfile = os.path.join(outdir, cfgfile)
+                os.rename(tmpfile, outfile)
+                os.chmod(outfile, 0644)
     if outdir:
         os.rmdir(tmpdir)
 
     print "Wrote %s configs to %s" % (count, outdir or tmpdir)
+    if errors:
+        print >> sys.stderr, "%s check file(s) skipped due to errors" % errors
 
 
 if __name__ == '__main__':